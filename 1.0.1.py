@@ -27,10 +27,25 @@
 import os
 import sys
 import logging
+import logging.handlers
+import queue
 import datetime
+import time
 import hashlib
 import re
-from concurrent.futures import ThreadPoolExecutor
+import mmap
+import functools
+import collections
+import itertools
+import threading
+import errno
+import multiprocessing
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
 from PyQt5.QtWidgets import (
     QApplication,
     QMainWindow,
@@ -44,234 +59,761 @@ from PyQt5.QtWidgets import (
     QProgressBar,
     QTextEdit,
 )
-from PyQt5.QtCore import pyqtSignal, QObject, QThread
-
-# 配置日志
-logging.basicConfig(
-    filename="file_renaming.log", level=logging.INFO, format="%(asctime)s - %(message)s"
-)
+from PyQt5.QtCore import pyqtSignal, QObject, QThread, QTimer
+from PyQt5.QtGui import QTextCursor
+
+try:
+    import blake3
+except ImportError:  # 未安装 blake3 时退回 hashlib.md5
+    blake3 = None
+
+# 抽样指纹：取文件头、中、尾三个窗口
+SAMPLE_WINDOW_SIZE = 64 * 1024
+# 小于该大小的文件直接比较完整哈希
+SAMPLE_MIN_FILE_SIZE = 196 * 1024
+# 不小于该大小的文件，两个文件的完整哈希并行计算
+PARALLEL_HASH_MIN_FILE_SIZE = 4 * 1024 * 1024
+# 小于该大小的文件才整体映射后交给 blake3；更大的文件按块读取，
+# 避免 32 位 Python 地址空间不足，也缩小文件映射期间被截断引发 SIGBUS 的风险
+MMAP_MAX_FILE_SIZE = 256 * 1024 * 1024
+
+# 同时挂起的最大任务数。线程池模式下每个任务是一小块文件，进程池模式下每个任务
+# 只是一个目录路径，挂起任务占用的内存与目录大小无关
+MAX_PENDING_TASKS = 1024
+# 线程池模式下每个任务处理的文件数
+FILES_PER_TASK = 16
+# 等待任务完成时取回文件结果的间隔（秒）
+RESULT_POLL_INTERVAL = 0.05
+# Windows 上 ProcessPoolExecutor 支持的最大工作进程数
+WINDOWS_MAX_PROCESS_WORKERS = 61
+
+# 非法字符替换表，str.translate 比正则替换更快
+_ILLEGAL_CHARS_TABLE = str.maketrans({char: "_" for char in '\\/*?:"<>|'})
+# 预编译正则，避免每个文件重复解析
+_DATE_PREFIX_RE = re.compile(r"^\d{4}-\d{2}-\d{2} ")
+
+# 界面日志的刷新间隔（毫秒）
+LOG_FLUSH_INTERVAL_MS = 100
+# 每次刷新最多写入的消息数，以及日志区域最多保留的行数
+LOG_MAX_MESSAGES_PER_FLUSH = 500
+LOG_MAX_BLOCK_COUNT = 5000
+
+
+def setup_logging():
+    """
+    配置日志：调用方只把日志记录放入内存队列，由后台监听线程负责写入文件，
+    避免界面线程和工作线程等待磁盘写入。返回已启动的监听器。
+    """
+    log_queue = queue.Queue(-1)
+    file_handler = logging.FileHandler("file_renaming.log")
+    file_handler.setFormatter(logging.Formatter("%(asctime)s - %(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, file_handler)
+    # 队列处理器只保留原始消息，时间等格式由文件处理器添加
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(message)s",
+        handlers=[logging.handlers.QueueHandler(log_queue)],
+    )
+    listener.start()
+    return listener
 
 
 class WorkerSignals(QObject):
     progress = pyqtSignal(int, str)
+    message = pyqtSignal(str)
     finished = pyqtSignal()
 
 
+# 同一进程内共享的冲突序号，记录每个目标路径上次使用的序号，
+# 后续冲突从该序号继续探测，而不是每次从 1 开始
+_conflict_files = {}
+# 各目录已有文件名的快照，按需用 os.scandir 读取一次，之后随重命名更新
+_directory_names = {}
+# 本次运行中被写入过的路径；这些路径在遍历时取得的 stat 已属于其他文件
+_written_paths = set()
+# 本地日期缓存：以 UTC 天序号为键，值为与这一天相交的本地日期区间
+# (起始时间戳, 结束时间戳, 日期字符串) 列表
+_date_spans = {}
+# 可重入锁：选定文件名与移动文件需在同一个临界区内完成
+_conflict_lock = threading.RLock()
+
+
 class FileRenamer:
     @staticmethod
-    def calculate_file_hash(filepath, block_size=65536):
-        hasher = hashlib.md5()
-        with open(filepath, "rb") as f:
-            while True:
-                data = f.read(block_size)
-                if not data:
-                    break
-                hasher.update(data)
+    def new_hasher():
+        if blake3 is not None:
+            # 哈希总在工作线程或工作进程中计算，已经按文件并行，
+            # 使用单线程模式，避免每个工作者再各自占满所有 CPU
+            return blake3.blake3()
+        return hashlib.md5()
+
+    @staticmethod
+    def calculate_file_hash(filepath, block_size=4 * 1024 * 1024, stat_result=None):
+        # 以 (路径, inode, 大小, 修改时间, 状态变更时间) 为键缓存哈希，文件被修改或替换后
+        # 自动失效；原地改写后恢复修改时间（如 rsync --inplace、touch -d）也会更新 ctime
+        if stat_result is None:
+            stat_result = os.stat(filepath)
+        return FileRenamer.cached_file_hash(
+            filepath,
+            stat_result.st_ino,
+            stat_result.st_size,
+            stat_result.st_mtime_ns,
+            stat_result.st_ctime_ns,
+            block_size,
+        )
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def cached_file_hash(filepath, inode, size, mtime_ns, ctime_ns, block_size):
+        hasher = FileRenamer.new_hasher()
+        # 已按块读取，关闭内置缓冲以减少一次内存拷贝
+        with open(filepath, "rb", buffering=0) as f:
+            if hasattr(os, "posix_fadvise"):
+                # 提示内核按顺序读取，以便更积极地预读
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            if (
+                blake3 is not None
+                and 0 < os.fstat(f.fileno()).st_size < MMAP_MAX_FILE_SIZE
+            ):
+                # 整个文件映射后一次性交给 blake3，由其内部完成 SIMD 分块计算
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    hasher.update(mm)
+            else:
+                for data in iter(functools.partial(f.read, block_size), b""):
+                    hasher.update(data)
+        return hasher.digest()
+
+    @staticmethod
+    def sampled_fingerprint(filepath, size=None):
+        """
+        对文件的头、中、尾三个 64 KiB 窗口分别计算哈希，再合并哈希为指纹。
+        """
+        if size is None:
+            size = os.stat(filepath).st_size
+        offsets = (0, size // 2, size - SAMPLE_WINDOW_SIZE)
+        hasher = FileRenamer.new_hasher()
+        with open(filepath, "rb", buffering=0) as f:
+            for offset in offsets:
+                f.seek(offset)
+                window_hasher = FileRenamer.new_hasher()
+                window_hasher.update(f.read(SAMPLE_WINDOW_SIZE))
+                hasher.update(window_hasher.digest())
         return hasher.digest()
 
     @staticmethod
     def check_duplicate_file(file_path, new_path):
-        if os.path.getsize(file_path) != os.path.getsize(new_path):
+        # 每次比较都重新获取两个文件的 stat，避免使用其他文件处理期间过期的结果
+        file_stat = os.stat(file_path)
+        try:
+            new_stat = os.stat(new_path)
+        except FileNotFoundError:
+            return False
+        file_size = file_stat.st_size
+        if file_size != new_stat.st_size:
+            return False
+        # 大文件先比较抽样指纹，不同则无需读取整个文件
+        if file_size >= SAMPLE_MIN_FILE_SIZE and FileRenamer.sampled_fingerprint(
+            file_path, file_size
+        ) != FileRenamer.sampled_fingerprint(new_path, file_size):
             return False
+        if file_size >= PARALLEL_HASH_MIN_FILE_SIZE:
+            # 读取文件主要耗在 I/O 上，且哈希计算期间会释放 GIL，两个文件可并行计算
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                file_hash = executor.submit(
+                    FileRenamer.calculate_file_hash, file_path, stat_result=file_stat
+                )
+                new_hash = executor.submit(
+                    FileRenamer.calculate_file_hash, new_path, stat_result=new_stat
+                )
+                return file_hash.result() == new_hash.result()
         return FileRenamer.calculate_file_hash(
-            file_path
-        ) == FileRenamer.calculate_file_hash(new_path)
+            file_path, stat_result=file_stat
+        ) == FileRenamer.calculate_file_hash(new_path, stat_result=new_stat)
 
     @staticmethod
     def clean_filename(filename):
-        illegal_chars = r'[\\/*?:"<>|]'
-
-        return re.sub(illegal_chars, "_", filename)
+        return filename.translate(_ILLEGAL_CHARS_TABLE)
 
     @staticmethod
-    def get_file_time(filepath, time_type="creation"):
+    def get_file_time(filepath, time_type="creation", stat_result=None):
+        """
+        获取文件时间。可传入遍历时已取得的 stat 结果，避免再次调用 stat。
+        """
+        if stat_result is None:
+            stat_result = os.stat(filepath)
         if time_type == "creation":
-            return os.path.getctime(filepath)
+            # st_birthtime 为真实创建时间（Windows 需 Python 3.12+，macOS/BSD 均支持），
+            # 不可用时退回 st_ctime
+            return getattr(stat_result, "st_birthtime", stat_result.st_ctime)
         elif time_type == "modification":
-            return os.path.getmtime(filepath)
+            return stat_result.st_mtime
         else:
             raise ValueError("Invalid time_type. Use 'creation' or 'modification'.")
 
     @staticmethod
-    def handle_filename_conflict(new_path, original_name, conflict_files):
-        base_dir = os.path.dirname(new_path)
-        base_name = os.path.basename(new_path)
-        name_parts = os.path.splitext(base_name)
-        base_name_without_ext, file_ext = name_parts[0], name_parts[1]
+    def format_file_date(file_time):
+        """
+        将时间戳格式化为本地日期"YYYY-MM-DD"。每个本地日期只计算一次，
+        之后落在该日期时间区间内的时间戳直接复用结果，对任何 UTC 偏移都成立。
+        """
+        for start, end, date_string in _date_spans.get(int(file_time // 86400), ()):
+            if start <= file_time < end:
+                return date_string
+        return FileRenamer.cache_date_span(file_time)
 
-        if base_name in conflict_files:
-            conflict_count = conflict_files[base_name]
-        else:
-            conflict_count = 0
+    @staticmethod
+    def cache_date_span(file_time):
+        """
+        计算时间戳所在的本地日期字符串，并缓存这一天的 [0 点, 次日 0 点) 区间。
+        """
+        date = datetime.date.fromtimestamp(file_time)
+        # date.isoformat 不依赖区域设置，比 strftime 更快
+        date_string = date.isoformat()
+        try:
+            start = datetime.datetime(date.year, date.month, date.day).timestamp()
+            end = start + 86400
+            # 只缓存 UTC 偏移在整天内不变的日期：当天恰好 24 小时，区间内的时间戳
+            # 必然落在同一个本地日期。夏令时切换等特殊日期可能不连续（如 0:01 回拨到
+            # 前一天 23:01），每次重新计算
+            start_time = time.localtime(start)
+            cacheable = (
+                start <= file_time < end
+                and start_time[:6] == (date.year, date.month, date.day, 0, 0, 0)
+                and start_time.tm_gmtoff == time.localtime(end - 1).tm_gmtoff
+            )
+        except (OverflowError, OSError, ValueError):
+            cacheable = False
+        if cacheable:
+            span = (start, end, date_string)
+            for day in range(int(start // 86400), int(-(-end // 86400))):
+                # 不同线程可能重复添加同一区间，结果仍然正确
+                _date_spans.setdefault(day, []).append(span)
+        return date_string
+
+    @staticmethod
+    def handle_filename_conflict(new_path, original_name, conflict_files):
+        # 只解析一次路径，循环内仅做字符串拼接
+        base_dir, base_name = os.path.split(new_path)
+        # base_name 为空时 [:-0] 会得到空串，按长度切片
+        dir_prefix = new_path[: len(new_path) - len(base_name)]
+        base_name_without_ext, file_ext = os.path.splitext(base_name)
+
+        # 冲突记录可能跨目录共享，因此以完整路径为键
+        conflict_key = new_path
+        new_name = base_name
+        with _conflict_lock:
+            existing_names = FileRenamer.directory_names(base_dir)
+            conflict_count = conflict_files.get(conflict_key, 0)
 
-        while os.path.exists(new_path):
-            conflict_count += 1
-            new_name = f"{base_name_without_ext}_{conflict_count}{file_ext}"
-            new_path = os.path.join(base_dir, new_name)
-            conflict_files[base_name] = conflict_count
+            while True:
+                # 在已有文件名集合中探测，不调用任何 os.path 函数
+                while new_name in existing_names:
+                    conflict_count += 1
+                    new_name = f"{base_name_without_ext}_{conflict_count}{file_ext}"
+                new_path = dir_prefix + new_name
+                # 对选出的候选名调用一次 exists 确认，以发现其他进程新建的文件
+                if not os.path.exists(new_path):
+                    break
+                existing_names.add(new_name)
+            conflict_files[conflict_key] = conflict_count
+            # 预留选定的文件名，避免其他线程选中同一个
+            existing_names.add(new_name)
 
         return new_path, conflict_files
 
     @staticmethod
-    def has_valid_date_prefix(file, date_prefix):
-        cleaned_file = FileRenamer.clean_filename(file)
+    def move_to_free_name(file_path, new_path, original_name, conflict_files):
+        """
+        为 new_path 选出一个空闲的文件名并把文件移动过去，返回最终路径。
+        选名、预留和移动在同一个临界区内完成，其他线程不会选中同一个目标。
+        """
+        with _conflict_lock:
+            new_path, conflict_files = FileRenamer.handle_filename_conflict(
+                new_path, original_name, conflict_files
+            )
+            try:
+                FileRenamer.move_file(file_path, new_path)
+            except OSError:
+                # 移动失败时释放预留的文件名，快照仍与目录内容一致
+                if not os.path.lexists(new_path):
+                    directory, name = os.path.split(new_path)
+                    FileRenamer.directory_names(directory).discard(name)
+                raise
+            FileRenamer.record_rename(file_path, new_path)
+        return new_path
+
+    @staticmethod
+    def name_taken(filepath):
+        """
+        根据目录文件名快照判断路径是否已被占用（包括已预留的文件名）。
+        """
+        directory, name = os.path.split(filepath)
+        with _conflict_lock:
+            return name in FileRenamer.directory_names(directory)
+
+    @staticmethod
+    def directory_names(directory):
+        """
+        返回目录中已有文件名的集合，调用方需持有 _conflict_lock。
+        """
+        names = _directory_names.get(directory)
+        if names is None:
+            with os.scandir(directory) as it:
+                names = _directory_names[directory] = {entry.name for entry in it}
+        return names
+
+    @staticmethod
+    def record_rename(old_path, new_path):
+        with _conflict_lock:
+            old_names = _directory_names.get(os.path.dirname(old_path))
+            if old_names is not None:
+                old_names.discard(os.path.basename(old_path))
+            new_names = _directory_names.get(os.path.dirname(new_path))
+            if new_names is not None:
+                new_names.add(os.path.basename(new_path))
+            _written_paths.add(new_path)
+
+    @staticmethod
+    def was_written(filepath):
+        with _conflict_lock:
+            return filepath in _written_paths
+
+    @staticmethod
+    def move_file(src, dst):
+        """
+        将文件移动到 dst，且不会覆盖已有文件：若目标在此期间被创建，抛出 FileExistsError。
+        """
+        if os.name == "nt":
+            # Windows 上 os.rename 在目标已存在时直接报错，本身就不会覆盖
+            os.rename(src, dst)
+            return
+        try:
+            # 硬链接在目标已存在时必定失败，检查与创建是一个原子操作
+            os.link(src, dst, follow_symlinks=False)
+        except FileExistsError:
+            raise
+        except (NotImplementedError, OSError):
+            # 文件系统不支持硬链接（如 FAT32、部分网络共享）时，在锁内检查后重命名
+            with _conflict_lock:
+                if os.path.lexists(dst):
+                    raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), dst)
+                os.rename(src, dst)
+            return
+        try:
+            os.unlink(src)
+        except OSError:
+            # 删除原文件失败时撤销新建的链接，避免文件同时留在两个文件名下
+            os.unlink(dst)
+            raise
+
+    @staticmethod
+    def reset_conflict_files():
+        with _conflict_lock:
+            _conflict_files.clear()
+            _directory_names.clear()
+            _written_paths.clear()
+        # 哈希结果只在一次运行内复用，避免命中上次运行时缓存的旧结果
+        FileRenamer.cached_file_hash.cache_clear()
+        # 日期区间依赖当前时区，每次运行重新建立
+        _date_spans.clear()
+
+    @staticmethod
+    def has_valid_date_prefix(cleaned_file, date_prefix):
+        """
+        检查已清理过非法字符的文件名是否以指定日期前缀开头。
+        """
         return cleaned_file.startswith(date_prefix)
 
     @staticmethod
     def remove_date_prefix(file):
-        date_prefix_pattern = r"^\d{4}-\d{2}-\d{2} "
-        cleaned_file = re.sub(date_prefix_pattern, "", file)
+        cleaned_file = _DATE_PREFIX_RE.sub("", file)
         return cleaned_file
 
     @staticmethod
     def has_yy_mm_dd_prefix(file):
         """
         检查文件名是否以"YYYY-MM-DD "格式的前缀开头。
+        前缀长度固定，直接按位置切片比较；非法字符清理不影响前缀，无需先清理。
         """
-        cleaned_file = FileRenamer.clean_filename(file)
-        return re.match(r"^\d{4}-\d{2}-\d{2} ", cleaned_file) is not None
+        return (
+            len(file) >= 11
+            and file[4] == "-"
+            and file[7] == "-"
+            and file[10] == " "
+            and file[:4].isdecimal()
+            and file[5:7].isdecimal()
+            and file[8:10].isdecimal()
+        )
 
     @staticmethod
     def remove_yy_mm_dd_prefix(file):
         """
         从文件名中移除"YYYY-MM-DD "格式的前缀。
         """
-        cleaned_file = re.sub(r"^\d{4}-\d{2}-\d{2} ", "", file)
-        return cleaned_file
+        if FileRenamer.has_yy_mm_dd_prefix(file):
+            return file[11:]
+        return file
 
     @staticmethod
-    def rename_file_with_date(file_path, time_type, signals):
+    def rename_file_with_date(
+        file_path, time_type, stat_result=None, conflict_files=None
+    ):
+        if conflict_files is None:
+            conflict_files = _conflict_files
+        messages = []
         try:
-            file_time = FileRenamer.get_file_time(file_path, time_type)
-            date_formatted = datetime.datetime.fromtimestamp(file_time).strftime(
-                "%Y-%m-%d"
-            )
+            file_time = FileRenamer.get_file_time(file_path, time_type, stat_result)
+            date_formatted = FileRenamer.format_file_date(file_time)
             date_prefix = f"{date_formatted} "
 
             original_name = os.path.basename(file_path)
             cleaned_name = FileRenamer.clean_filename(original_name)
 
+            if FileRenamer.has_valid_date_prefix(cleaned_name, date_prefix):
+                messages.append(
+                    f"[已有]文件 {original_name} 的日期格式已正确，无需重命名。"
+                )
+                return messages
+
+            # 仅在日期不一致时才去除旧前缀
             name_without_prefix = FileRenamer.remove_date_prefix(cleaned_name)
 
             new_name = f"{date_prefix}{name_without_prefix}"
             new_path = os.path.join(os.path.dirname(file_path), new_name)
 
-            if FileRenamer.has_valid_date_prefix(name_without_prefix, date_prefix):
-                signals.progress.emit(
-                    1, f"[已有]文件 {original_name} 的日期格式已正确，无需重命名。"
+            # 目标文件名已被占用时才检查是否重复；快照未包含的新文件由
+            # move_to_free_name 在选名时用 exists 确认
+            if FileRenamer.name_taken(new_path) and FileRenamer.check_duplicate_file(
+                file_path, new_path
+            ):
+                messages.append(f"[重复]发现重复文件 {original_name}，将删除原有文件。")
+                # 目标与原文件内容相同，用 os.replace 原子地覆盖
+                with _conflict_lock:
+                    os.replace(file_path, new_path)
+                    FileRenamer.record_rename(file_path, new_path)
+            else:
+                new_path = FileRenamer.move_to_free_name(
+                    file_path, new_path, original_name, conflict_files
                 )
-                return
-
-            conflict_files = {}
-            new_path, conflict_files = FileRenamer.handle_filename_conflict(
-                new_path, original_name, conflict_files
-            )
-
-            if os.path.exists(new_path):
-                if FileRenamer.check_duplicate_file(file_path, new_path):
-                    signals.progress.emit(
-                        1, f"[重复]发现重复文件 {original_name}，将删除原有文件。"
-                    )
-                    os.remove(new_path)
-                else:
-                    signals.progress.emit(
-                        1,
-                        f"[跳过]文件 {original_name} 与 {new_name} 冲突，但文件内容不同，将跳过重命名。",
-                    )
-                    return
-
-            os.rename(file_path, new_path)
-            signals.progress.emit(
-                1, f"[成功]文件 {original_name} 已重命名为 {new_name}"
-            )
+                new_name = os.path.basename(new_path)
+            messages.append(f"[成功]文件 {original_name} 已重命名为 {new_name}")
 
         except Exception as e:
-            signals.progress.emit(1, f"[错误]处理文件 {file_path} 时出错: {str(e)}")
+            messages.append(f"[错误]处理文件 {file_path} 时出错: {str(e)}")
+
+        return messages
 
     @staticmethod
-    def restore_original_name(file_path, signals):
+    def restore_original_name(file_path, conflict_files=None):
+        if conflict_files is None:
+            conflict_files = _conflict_files
+        messages = []
         try:
             original_name = os.path.basename(file_path)
             cleaned_name = FileRenamer.clean_filename(original_name)
 
             if not FileRenamer.has_yy_mm_dd_prefix(cleaned_name):
-                signals.progress.emit(
-                    1, f"[跳过]文件 {original_name} 不符合恢复条件，无需处理。"
+                messages.append(
+                    f"[跳过]文件 {original_name} 不符合恢复条件，无需处理。"
                 )
-                return
+                return messages
 
             new_name = FileRenamer.remove_yy_mm_dd_prefix(cleaned_name)
+            if not new_name:
+                messages.append(
+                    f"[跳过]文件 {original_name} 去除日期前缀后文件名为空，无法恢复。"
+                )
+                return messages
             new_path = os.path.join(os.path.dirname(file_path), new_name)
 
-            conflict_files = {}
-            new_path, conflict_files = FileRenamer.handle_filename_conflict(
-                new_path, original_name, conflict_files
-            )
-
-            if os.path.exists(new_path):
-                if FileRenamer.check_duplicate_file(file_path, new_path):
-                    signals.progress.emit(
-                        1, f"[重复]发现重复文件 {original_name}，将删除原有文件。"
-                    )
-                    os.remove(new_path)
-                else:
-                    signals.progress.emit(
-                        1,
-                        f"[跳过]文件 {original_name} 与 {new_name} 冲突，但文件内容不同，将跳过恢复。",
-                    )
-                    return
-
-            os.rename(file_path, new_path)
-            signals.progress.emit(
-                1, f"[成功]文件 {original_name} 已恢复为 {new_name}"
-            )
+            # 目标文件名已被占用时才检查是否重复；快照未包含的新文件由
+            # move_to_free_name 在选名时用 exists 确认
+            if FileRenamer.name_taken(new_path) and FileRenamer.check_duplicate_file(
+                file_path, new_path
+            ):
+                messages.append(f"[重复]发现重复文件 {original_name}，将删除原有文件。")
+                # 目标与原文件内容相同，用 os.replace 原子地覆盖
+                with _conflict_lock:
+                    os.replace(file_path, new_path)
+                    FileRenamer.record_rename(file_path, new_path)
+            else:
+                new_path = FileRenamer.move_to_free_name(
+                    file_path, new_path, original_name, conflict_files
+                )
+                new_name = os.path.basename(new_path)
+            messages.append(f"[成功]文件 {original_name} 已恢复为 {new_name}")
 
         except Exception as e:
-            signals.progress.emit(1, f"[错误]处理文件 {file_path} 时出错: {str(e)}")
+            messages.append(f"[错误]处理文件 {file_path} 时出错: {str(e)}")
+
+        return messages
+
+
+def process_file(operation_mode, time_type, file_path, stat_result=None):
+    """
+    处理单个文件并返回处理消息列表。定义在模块级别，以便传递给工作进程。
+    """
+    if operation_mode == "add_prefix":
+        return FileRenamer.rename_file_with_date(file_path, time_type, stat_result)
+    elif operation_mode == "restore_name":
+        return FileRenamer.restore_original_name(file_path)
+    return []
+
+
+def process_files(operation_mode, time_type, result_queue, files):
+    """
+    依次处理一组 (文件路径, stat 结果)，每处理完一个文件就把 (路径, 消息列表)
+    放入 result_queue，由调用方逐个文件报告进度。
+    """
+    for path, stat_result in files:
+        # 路径在本次运行中被写入过时，遍历时的 stat 已过期，改为重新获取
+        if FileRenamer.was_written(path):
+            stat_result = None
+        result_queue.put(
+            (path, process_file(operation_mode, time_type, path, stat_result))
+        )
+
+
+def entry_stat(entry):
+    """
+    返回 DirEntry 缓存的 stat 结果；出错时返回 None，交由处理函数重新获取并记录错误。
+    """
+    try:
+        return entry.stat()
+    except OSError:
+        return None
+
+
+def process_directory(operation_mode, time_type, result_queue, directory):
+    """
+    进程池模式的任务：工作进程自行读取目录并处理其中的文件。任务参数只有目录路径，
+    结果逐个文件放入队列，文件再多也不会整批在进程间传递。
+    """
+    entries, _ = scan_directory(directory)
+    process_files(
+        operation_mode,
+        time_type,
+        result_queue,
+        ((entry.path, entry_stat(entry)) for entry in entries),
+    )
+
+
+def scan_directory(directory):
+    """
+    读取单个目录，返回 (该目录下所有文件的 DirEntry, 子目录路径列表)。
+    文件按 inode 排序，使处理顺序尽量接近磁盘上的存放顺序。Windows 的目录列表不含
+    inode，DirEntry.inode() 每次都要单独打开文件查询，NTFS 的文件号也不反映存放位置，
+    因此只按文件名排序。
+    """
+    entries = []
+    subdirs = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            # 与 os.walk 保持一致：不进入指向目录的符号链接
+            if entry.is_dir():
+                if not entry.is_symlink():
+                    subdirs.append(entry.path)
+            else:
+                entries.append(entry)
+    if os.name == "nt":
+        entries.sort(key=lambda entry: entry.name)
+    else:
+        entries.sort(key=lambda entry: (entry.inode(), entry.path))
+    return entries, subdirs
+
+
+def scan_files(folder_path):
+    """
+    单次遍历文件夹，按目录分组返回 (目录, 该目录下所有文件的 DirEntry)。
+    """
+    directories = []
+    pending_dirs = [folder_path]
+    while pending_dirs:
+        directory = pending_dirs.pop()
+        try:
+            entries, subdirs = scan_directory(directory)
+        except OSError:
+            continue
+        pending_dirs.extend(subdirs)
+        if entries:
+            directories.append((directory, entries))
+    return directories
 
 
 class RenamingWorker(QObject):
-    def __init__(self, folder_path, time_type, operation_mode, progress_callback):
+    def __init__(
+        self,
+        folder_path,
+        time_type,
+        operation_mode,
+        progress_callback,
+        use_processes=False,
+    ):
         super().__init__()
         self.folder_path = folder_path
         self.time_type = time_type
         self.operation_mode = operation_mode
         self.progress_callback = progress_callback
+        # 为 True 时使用进程池：每个目录只交给一个工作进程，适合子目录很多的文件夹；
+        # 默认使用线程池，同一目录内的文件也能并行处理
+        self.use_processes = use_processes
         self.total_files = 0
-        self.processed_files = 0
+        # itertools.count 由 C 实现，在 GIL 下 next() 是原子操作，多线程计数不会丢失
+        self._counter = itertools.count(1)
+        self.last_percent = -1
+        self.unprocessed_files = 0
 
     def run(self):
-        self.total_files = sum(len(files) for _, _, files in os.walk(self.folder_path))
-        self.processed_files = 0
+        self.unprocessed_files = 0
+        try:
+            directories = scan_files(self.folder_path)
+            self.total_files = sum(len(entries) for _, entries in directories)
+            self._counter = itertools.count(1)
+            self.last_percent = -1
+
+            # 线程池模式下目录快照和冲突序号在本进程内共享；进程池模式下每个工作进程
+            # 各自维护一份，且同一目录只由一个工作进程处理
+            FileRenamer.reset_conflict_files()
+            if self.use_processes:
+                self.run_in_processes(directories)
+            else:
+                self.run_in_threads(directories)
+        except Exception as e:
+            self.progress_callback.message.emit(f"[错误]处理过程中出错: {str(e)}")
+        finally:
+            # 无论是否出错都发出结束信号，界面才能恢复按钮并结束线程
+            if self.unprocessed_files:
+                self.progress_callback.message.emit(
+                    f"[错误]共有 {self.unprocessed_files} 个文件未处理或处理结果未知，请检查日志。"
+                )
+            self.progress_callback.progress.emit(0, "所有文件处理完成！")
+            self.progress_callback.finished.emit()
 
-        with ThreadPoolExecutor() as executor:
-            for root, _, files in os.walk(self.folder_path):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    if self.operation_mode == "add_prefix":
-                        executor.submit(self.rename_file_with_date, file_path)
-                    elif self.operation_mode == "restore_name":
-                        executor.submit(self.restore_original_name, file_path)
-
-        self.progress_callback.progress.emit(0, "所有文件处理完成！")
-        self.progress_callback.finished.emit()
-
-    def rename_file_with_date(self, file_path):
-        FileRenamer.rename_file_with_date(
-            file_path, self.time_type, self.progress_callback
+    def run_in_threads(self, directories):
+        """
+        线程池模式：把每个目录切成每块 FILES_PER_TASK 个文件的小任务。各线程共享
+        同一份目录快照，选名与移动在同一个临界区内完成，同一目录也可以并行处理。
+        """
+        result_queue = queue.Queue()
+        worker = functools.partial(
+            process_files, self.operation_mode, self.time_type, result_queue
         )
-        self.processed_files += 1
-        self.progress_callback.progress.emit(
-            int((self.processed_files / self.total_files) * 100),
-            f"进度: {self.processed_files}/{self.total_files} ({(self.processed_files/self.total_files)*100:.2f}%)",
+        tasks = (
+            self.entry_task(entries[start : start + FILES_PER_TASK])
+            for _, entries in directories
+            for start in range(0, len(entries), FILES_PER_TASK)
         )
+        with ThreadPoolExecutor() as executor:
+            self.dispatch(executor, worker, tasks, result_queue)
 
-    def restore_original_name(self, file_path):
-        FileRenamer.restore_original_name(file_path, self.progress_callback)
-        self.processed_files += 1
+    def run_in_processes(self, directories):
+        """
+        进程池模式：工作进程之间不共享目录快照，因此每个目录只交给一个工作进程，
+        不同进程不会争抢同一个目标文件名。任务只传递目录路径，结果经由管理器队列
+        逐个文件传回。
+        """
+        # 使用 spawn 启动工作进程，避免在运行中的 Qt 程序里从 QThread 内 fork
+        context = multiprocessing.get_context("spawn")
+        max_workers = os.cpu_count() or 1
+        if os.name == "nt":
+            # Windows 上 ProcessPoolExecutor 的工作进程数超过 61 时会抛出 ValueError
+            max_workers = min(max_workers, WINDOWS_MAX_PROCESS_WORKERS)
+        with context.Manager() as manager:
+            result_queue = manager.Queue()
+            worker = functools.partial(
+                process_directory, self.operation_mode, self.time_type, result_queue
+            )
+            tasks = (
+                ([entry.path for entry in entries], directory)
+                for directory, entries in directories
+            )
+            with ProcessPoolExecutor(
+                max_workers=max_workers, mp_context=context
+            ) as executor:
+                self.dispatch(executor, worker, tasks, result_queue)
+
+    @staticmethod
+    def entry_task(entries):
+        """
+        把一组 DirEntry 转为 (文件路径列表, 任务参数)，任务参数为
+        (文件路径, 遍历时缓存的 stat 结果) 列表。
+        """
+        files = [(entry.path, entry_stat(entry)) for entry in entries]
+        return [path for path, _ in files], files
+
+    def dispatch(self, executor, worker, tasks, result_queue):
+        """
+        按顺序提交 tasks 产出的 (任务涉及的文件路径, 任务参数)，最多同时挂起
+        MAX_PENDING_TASKS 个任务。任务运行期间逐个文件报告结果；任务失败时，
+        报告其中尚未返回结果的文件。
+        """
+        # 文件路径 -> 所属任务；任务 -> 尚未返回结果的文件路径
+        owners = {}
+        unreported = {}
+        paths = []
+        try:
+            for paths, argument in tasks:
+                while len(unreported) >= MAX_PENDING_TASKS:
+                    self.collect_results(result_queue, owners, unreported)
+                future = executor.submit(worker, argument)
+                unreported[future] = set(paths)
+                owners.update(dict.fromkeys(paths, future))
+                paths = []
+            while unreported:
+                self.collect_results(result_queue, owners, unreported)
+        except Exception as e:
+            # 提交任务或等待结果时出错（例如工作进程意外退出导致进程池损坏），
+            # 剩余文件可能未处理，也可能已处理但结果无法取回
+            remaining = itertools.chain(
+                paths,
+                itertools.chain.from_iterable(unreported.values()),
+                itertools.chain.from_iterable(paths for paths, _ in tasks),
+            )
+            for path in remaining:
+                self.report_unprocessed(path, e)
+
+    def collect_results(self, result_queue, owners, unreported):
+        """
+        等待任一任务完成（最多 RESULT_POLL_INTERVAL 秒），报告期间返回的文件结果，
+        再结束已完成的任务。
+        """
+        done, _ = wait(
+            unreported, timeout=RESULT_POLL_INTERVAL, return_when=FIRST_COMPLETED
+        )
+        # 任务完成前放入队列的结果此时都已可取，先全部取出再结束这些任务
+        while True:
+            try:
+                path, messages = result_queue.get_nowait()
+            except queue.Empty:
+                break
+            future = owners.pop(path, None)
+            if future is not None:
+                unreported[future].discard(path)
+            self.report_progress(messages)
+        for future in done:
+            # 任务异常会被收集而不是丢弃
+            error = future.exception()
+            for path in unreported.pop(future):
+                del owners[path]
+                self.report_unprocessed(path, error)
+
+    def report_unprocessed(self, path, error=None):
+        self.unprocessed_files += 1
+        reason = f": {str(error)}" if error is not None else ""
+        self.report_progress([f"[错误]文件 {path} 未处理或处理结果未知{reason}"])
+
+    def report_progress(self, messages):
+        for message in messages:
+            self.progress_callback.message.emit(message)
+        done = next(self._counter)
+        # 仅在整数百分比变化时更新进度，避免每个文件都刷新界面
+        percent = int((done / self.total_files) * 100)
+        if percent == self.last_percent:
+            return
+        self.last_percent = percent
         self.progress_callback.progress.emit(
-            int((self.processed_files / self.total_files) * 100),
-            f"进度: {self.processed_files}/{self.total_files} ({(self.processed_files/self.total_files)*100:.2f}%)",
+            percent,
+            f"进度: {done}/{self.total_files} ({(done/self.total_files)*100:.2f}%)",
         )
 
 
@@ -281,6 +823,7 @@ class MainWindow(QMainWindow):
         self.folder_path = ""
         self.time_type = "creation"
         self.operation_mode = "add_prefix"
+        self.pending_log_messages = collections.deque()
         self.init_ui()
 
     def init_ui(self):
@@ -330,7 +873,12 @@ class MainWindow(QMainWindow):
         layout.addWidget(log_label)
         self.log_text = QTextEdit()
         self.log_text.setReadOnly(True)
+        self.log_text.document().setMaximumBlockCount(LOG_MAX_BLOCK_COUNT)
         layout.addWidget(self.log_text)
+        # 定时批量写入日志区域，而不是每条消息都刷新一次界面
+        self.log_flush_timer = QTimer(self)
+        self.log_flush_timer.setInterval(LOG_FLUSH_INTERVAL_MS)
+        self.log_flush_timer.timeout.connect(self.flush_log_messages)
 
         # 开始按钮
         self.start_btn = QPushButton("开始处理")
@@ -363,20 +911,49 @@ class MainWindow(QMainWindow):
         self.worker.moveToThread(self.thread)
         self.thread.started.connect(self.worker.run)
         self.signals.progress.connect(self.update_progress)
+        self.signals.message.connect(self.append_log_message)
+        self.signals.finished.connect(self.finish_log_messages)
         self.signals.finished.connect(self.thread.quit)
         self.signals.finished.connect(self.worker.deleteLater)
         self.signals.finished.connect(self.thread.deleteLater)
         self.signals.finished.connect(lambda: self.start_btn.setEnabled(True))
+        self.log_flush_timer.start()
         self.thread.start()
 
     def update_progress(self, value, message):
         self.progress_bar.setValue(value)
-        self.log_text.append(message)
+        self.append_log_message(message)
+
+    def append_log_message(self, message):
+        self.pending_log_messages.append(message)
         logging.info(message)
 
+    def flush_log_messages(self, limit=LOG_MAX_MESSAGES_PER_FLUSH):
+        batch = []
+        while self.pending_log_messages and len(batch) < limit:
+            batch.append(self.pending_log_messages.popleft())
+        if not batch:
+            return
+        # 以纯文本插入，文件名中的 "<"、"&" 等字符不会被当作富文本解析
+        text = "\n".join(batch)
+        if not self.log_text.document().isEmpty():
+            text = "\n" + text
+        self.log_text.moveCursor(QTextCursor.End)
+        self.log_text.insertPlainText(text)
+
+    def finish_log_messages(self):
+        self.log_flush_timer.stop()
+        # 日志区域最多保留 LOG_MAX_BLOCK_COUNT 行，更早的消息不必再写入界面
+        while len(self.pending_log_messages) > LOG_MAX_BLOCK_COUNT:
+            self.pending_log_messages.popleft()
+        self.flush_log_messages(LOG_MAX_BLOCK_COUNT)
+
 
 if __name__ == "__main__":
+    log_listener = setup_logging()
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    exit_code = app.exec_()
+    log_listener.stop()
+    sys.exit(exit_code)
\ No newline at end of file